@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+#
+# Memory benchmark for snapmon metadata trimming
+#
+# Builds a synthetic 1000 client topology, then churns stream metadata
+# with large tags (cover art, comments) the way a long running monitor
+# sees it, and reports the memory retained with the plain library objects
+# and with snapmon's tag trimming and render cache. The saving comes from
+# stripping the unrendered tags out of the library's metadata, the render
+# cache itself is extra memory on top.
+#
+# Author: github.com/frafall
+#
+import sys
+import gc
+import random
+import asyncio
+import argparse
+import tracemalloc
+
+import snapcast.control
+
+import snapmon
+
+def synthetic_status(clients, groups, streams, unassigned):
+   status_streams = []
+   for s in range(streams + unassigned):
+      status_streams.append({
+         'id': 'stream-%d' %(s),
+         'status': 'playing',
+         'uri': {'path': '/tmp/snapfifo%d' %(s), 'query': {'name': 'Stream %d' %(s)}},
+         'meta': {},
+      })
+
+   status_groups = []
+   per_group = clients // groups
+   for g in range(groups):
+      group_clients = []
+      for c in range(g * per_group, (g + 1) * per_group):
+         group_clients.append({
+            'id': '00:11:22:%02x:%02x:%02x' %(c >> 16, (c >> 8) & 0xff, c & 0xff),
+            'connected': c % 10 != 0,
+            'host': {'name': 'speaker-%d' %(c), 'ip': '10.0.%d.%d' %(c >> 8, c & 0xff)},
+            'config': {'name': 'Speaker %d' %(c), 'latency': 0, 'volume': {'muted': False, 'percent': 50}},
+         })
+
+      status_groups.append({
+         'id': 'group-%d' %(g),
+         'name': 'Zone %d' %(g),
+         'muted': False,
+         'stream_id': 'stream-%d' %(g % streams),
+         'clients': group_clients,
+      })
+
+   return {'server': {
+      'server': {'snapserver': {'version': '0.15.0'}},
+      'streams': status_streams,
+      'groups': status_groups,
+   }}
+
+def synthetic_meta(n, cover):
+   return {
+      'ARTIST': 'Artist %d' %(n),
+      'ALBUM': 'Album %d' %(n),
+      'TITLE': 'Title %d' %(n),
+      'COMMENT': 'Comment %d ' %(n) * 200,
+      'COVER': ('%08d' %(n)) * (cover // 8),
+   }
+
+def churn(snapserver, updates, cover):
+   """Metadata updates followed by the callbacks, like Stream.OnUpdate"""
+   rnd = random.Random(0)
+   streams = snapserver.streams
+   for n in range(updates):
+      stream = rnd.choice(streams)
+      stream.update_meta(synthetic_meta(n, cover))
+      stream.callback()
+      for group in snapserver.groups:
+         if group.stream == stream.identifier:
+            group.callback()
+
+def measure(compact, args):
+   gc.collect()
+   tracemalloc.start()
+
+   loop = asyncio.new_event_loop()
+   snapserver = snapcast.control.Snapserver(loop, 'localhost')
+   snapserver.synchronize(synthetic_status(args.clients, args.groups, args.streams, args.unassigned))
+
+   cache_size = None
+   if compact:
+      before = tracemalloc.get_traced_memory()[0]
+      cache = snapmon.RenderCache()
+      cache.update(snapserver)
+      cache_size = tracemalloc.get_traced_memory()[0] - before
+
+      def on_group_update(group):
+         zone = cache.updateGroup(group)
+         cache.updateStream(snapserver.stream(zone.stream))
+
+      for group in snapserver.groups:
+         group.set_callback(on_group_update)
+      for stream in snapserver.streams:
+         stream.set_callback(cache.updateStream)
+
+   churn(snapserver, args.updates, args.cover)
+
+   gc.collect()
+   current, peak = tracemalloc.get_traced_memory()
+   tracemalloc.stop()
+   loop.close()
+
+   return current, peak, cache_size
+
+def main():
+   parser = argparse.ArgumentParser(description='snapmon metadata trimming memory benchmark')
+   parser.add_argument('--clients', type=int, default=1000)
+   parser.add_argument('--groups', type=int, default=100)
+   parser.add_argument('--streams', type=int, default=20)
+   parser.add_argument('--unassigned', type=int, default=5, help='Extra streams no group plays')
+   parser.add_argument('--updates', type=int, default=2000, help='Metadata updates')
+   parser.add_argument('--cover', type=int, default=64 * 1024, help='Cover art tag size in bytes')
+   args = parser.parse_args()
+
+   print('%d clients, %d groups, %d+%d streams, %d metadata updates with %d byte cover' %(
+      args.clients, args.groups, args.streams, args.unassigned, args.updates, args.cover))
+
+   for name, compact in (('library', False), ('snapmon', True)):
+      current, peak, cache_size = measure(compact, args)
+      print('   %-8s retained %8.1f KiB, peak %8.1f KiB' %(name, current / 1024.0, peak / 1024.0), end='')
+      if cache_size is not None:
+         print(', render cache %.1f KiB' %(cache_size / 1024.0), end='')
+      print()
+
+if __name__ == '__main__':
+   main()
@@ -0,0 +1,181 @@
+#
+# Bash completion for snapctl
+#
+# Group, client and stream names are read from the name cache snapctl
+# writes after every successful run, completion never contacts the server.
+#
+# Install by sourcing from ~/.bashrc:
+#    . /path/to/snapctl-completion.bash
+#
+# Author: github.com/frafall
+#
+
+# Rebuild the command line words in $words/$cword, gluing back together
+# what COMP_WORDBREAKS split off (client ids are MAC addresses, a:b:c)
+_snapctl_words()
+{
+   local line="${COMP_LINE:0:COMP_POINT}"
+   local offset=0 glued i word
+
+   words=()
+   for (( i=0; i <= COMP_CWORD; i++ )); do
+      word="${COMP_WORDS[i]}"
+      glued=1
+      while [[ "${line:offset:1}" == [[:space:]] ]]; do
+         (( offset++ ))
+         glued=0
+      done
+      (( offset += ${#word} ))
+
+      if (( glued && i > 0 )); then
+         words[${#words[@]}-1]+="$word"
+      else
+         words+=( "$word" )
+      fi
+   done
+   cword=$(( ${#words[@]} - 1 ))
+}
+
+# Undo backslash escapes, "Living\ Room" -> "Living Room"
+_snapctl_dequote()
+{
+   local word="$1" out="" c i
+
+   for (( i=0; i < ${#word}; i++ )); do
+      c="${word:i:1}"
+      if [[ "$c" == "\\" ]]; then
+         (( i++ ))
+         c="${word:i:1}"
+      fi
+      out+="$c"
+   done
+   printf '%s' "$out"
+}
+
+# Complete $cur from one of the cached name lists (clients, groups, streams)
+_snapctl_names()
+{
+   local cache="${XDG_CACHE_HOME:-$HOME/.cache}/snapctl/$1"
+   local match="$(_snapctl_dequote "$cur")"
+   local prefix="" names name reply
+
+   [ -r "$cache" ] || return
+
+   # Bash only replaces the text after the last ':' of the word
+   if [[ "$cur" == *:* ]]; then
+      prefix="${cur%"${cur##*:}"}"
+   fi
+
+   # Names come from the server, never let the shell expand them
+   mapfile -t names < "$cache"
+   for name in "${names[@]}"; do
+      if [[ "$name" == "$match"* ]]; then
+         reply="$(printf '%q' "$name")"
+         COMPREPLY+=( "${reply#"$prefix"}" )
+      fi
+   done
+}
+
+_snapctl()
+{
+   local words cword
+   local args=() word i pos kind
+
+   _snapctl_words
+   local cur="${words[cword]}"
+   local prev="${words[cword-1]}"
+
+   COMPREPLY=()
+
+   case "$prev" in
+      -s|--server|-w|--where|--at|-n|--count|-i|--interval)
+         return
+         ;;
+   esac
+
+   # Collect the positional words before the one being completed
+   for (( i=1; i < cword; i++ )); do
+      word="${words[i]}"
+      case "$word" in
+         -s|--server|-w|--where|--at|-n|--count|-i|--interval)
+            (( i++ ))
+            ;;
+         -*)
+            ;;
+         *)
+            args+=( "$word" )
+            ;;
+      esac
+   done
+
+   if [[ "$cur" == -* ]]; then
+      if [ "${args[0]}" = ping ]; then
+         COMPREPLY=( $(compgen -W "-h --help -n --count -i --interval -j --json" -- "$cur") )
+      else
+         COMPREPLY=( $(compgen -W "-h --help -v --verbose -d --debug -m --meta -s --server -w --where --at --align" -- "$cur") )
+      fi
+      return
+   fi
+
+   case "${#args[@]}" in
+      0)
+         COMPREPLY=( $(compgen -W "group stream client ping" -- "$cur") )
+         return
+         ;;
+      1)
+         case "${args[0]}" in
+            group)
+               COMPREPLY=( $(compgen -W "stream mute unmute volume show add delete rename" -- "$cur") )
+               ;;
+            stream)
+               COMPREPLY=( $(compgen -W "show" -- "$cur") )
+               ;;
+            client)
+               COMPREPLY=( $(compgen -W "show rename move mute unmute" -- "$cur") )
+               ;;
+         esac
+         return
+         ;;
+   esac
+
+   # Index of the subcommand argument being completed
+   pos=$(( ${#args[@]} - 2 ))
+
+   case "${args[0]} ${args[1]}" in
+      "group stream")
+         case $pos in
+            0) kind=groups ;;
+            1) kind=streams ;;
+         esac
+         ;;
+      "group volume")
+         (( pos > 0 )) && kind=groups
+         ;;
+      "group rename"|"group delete")
+         (( pos == 0 )) && kind=groups
+         ;;
+      "group mute"|"group unmute"|"group show")
+         kind=groups
+         ;;
+      "stream show")
+         kind=streams
+         ;;
+      "client rename")
+         (( pos == 0 )) && kind=clients
+         ;;
+      "client move")
+         if (( pos == 0 )); then
+            kind=groups
+         else
+            kind=clients
+         fi
+         ;;
+      "client mute"|"client unmute"|"client show")
+         kind=clients
+         ;;
+   esac
+
+   [ -n "$kind" ] && _snapctl_names $kind
+}
+
+complete -F _snapctl snapctl snapctl.py
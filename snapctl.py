@@ -16,57 +16,263 @@ import logging
 import argparse
 import asyncio
 import json
+import time
+import math
+import datetime
 
-import snapcast.control
+from snaplib import Session, tag, default, DEFAULT_SERVER
 
-def getdefault(a,b):
-   if a:
-      return a
-   return b
+def namecachedir():
+   """Directory holding the names used by shell completion"""
+   cachehome = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+   return os.path.join(cachehome, 'snapctl')
 
-def gettag(meta, tag, default):
-   if tag in meta:
-      return meta[tag]
-   return default
+def parseWhere(expr):
+   """Parse a --where 'key=value' expression"""
+   key, sep, value = expr.partition('=')
+   key, value = key.strip().lower(), value.strip()
+   if not sep or not key or not value:
+      raise argparse.ArgumentTypeError("filter '%s' is not of the form key=value" %(expr))
+
+   if key in ('muted', 'connected'):
+      try:
+         parseBool(value)
+      except ValueError as e:
+         raise argparse.ArgumentTypeError(str(e))
+
+   return key, value
+
+def parseTime(value):
+   """Parse --at, HH:MM[:SS[.ffffff]] local time or +SECONDS from now"""
+   if value.startswith('+'):
+      try:
+         return time.time() + float(value[1:])
+      except ValueError:
+         raise argparse.ArgumentTypeError("'%s' is not a number of seconds" %(value[1:]))
+
+   for fmt in ('%H:%M:%S.%f', '%H:%M:%S', '%H:%M'):
+      try:
+         clock = datetime.datetime.strptime(value, fmt).time()
+      except ValueError:
+         continue
+
+      # Next occurrence of that time of day
+      now = datetime.datetime.now()
+      when = datetime.datetime.combine(now.date(), clock)
+      if when <= now:
+         when += datetime.timedelta(days=1)
+      return when.timestamp()
+
+   raise argparse.ArgumentTypeError("'%s' is not HH:MM[:SS[.ffffff]] or +SECONDS" %(value))
+
+def parsePercent(value):
+   """Parse a volume percentage, 0-100"""
+   try:
+      percent = int(value)
+   except ValueError:
+      raise argparse.ArgumentTypeError("'%s' is not a whole number" %(value))
+
+   if not 0 <= percent <= 100:
+      raise argparse.ArgumentTypeError("volume %d is not in 0-100" %(percent))
+
+   return percent
+
+def parseCount(value):
+   """Parse a request count, at least 1"""
+   try:
+      count = int(value)
+   except ValueError:
+      raise argparse.ArgumentTypeError("'%s' is not a whole number" %(value))
+
+   if count < 1:
+      raise argparse.ArgumentTypeError("count %d is less than 1" %(count))
+
+   return count
+
+def parseBool(value):
+   if value.lower() in ('true', 'yes', 'on', '1'):
+      return True
+   if value.lower() in ('false', 'no', 'off', '0'):
+      return False
+   raise ValueError("'%s' is not a boolean" %(value))
+
+class SnapIndex(object):
+   """Per attribute indexes over one server status snapshot
+
+   Built once, then each --where filter is a set lookup and the
+   filters of a query are intersected.
+   """
+
+   # Filter keys supported for each kind of object
+   CLIENT_KEYS = ('muted', 'connected', 'group', 'stream', 'status')
+   GROUP_KEYS = ('muted', 'group', 'stream', 'status')
+   STREAM_KEYS = ('group', 'stream', 'status')
+
+   KEYS = {
+      'clients': CLIENT_KEYS,
+      'groups': GROUP_KEYS,
+      'streams': STREAM_KEYS,
+   }
+
+   def __init__(self, snapserver):
+      self.client_ids = set()
+      self.group_ids = set()
+      self.stream_ids = set()
+
+      self.muted_clients = set()
+      self.connected_clients = set()
+      self.muted_groups = set()
+
+      self.group_clients = {}    # group id -> client ids
+      self.group_stream = {}     # group id -> stream id
+      self.stream_groups = {}    # stream id -> group ids
+      self.status_streams = {}   # stream status -> stream ids
+
+      self.group_names = {}      # group name -> group ids
+      self.stream_names = {}     # stream name -> stream ids
+
+      for stream in snapserver.streams:
+         self.stream_ids.add(stream.identifier)
+         self.stream_groups.setdefault(stream.identifier, set())
+         self.status_streams.setdefault(stream.status, set()).add(stream.identifier)
+         self.stream_names.setdefault(stream.name, set()).add(stream.identifier)
+
+      for group in snapserver.groups:
+         self.group_ids.add(group.identifier)
+         self.group_stream[group.identifier] = group.stream
+         self.group_clients[group.identifier] = set(group.clients)
+         self.stream_groups.setdefault(group.stream, set()).add(group.identifier)
+         if group.name:
+            self.group_names.setdefault(group.name, set()).add(group.identifier)
+         if group.muted:
+            self.muted_groups.add(group.identifier)
+
+      for client in snapserver.clients:
+         self.client_ids.add(client.identifier)
+         if client.muted:
+            self.muted_clients.add(client.identifier)
+         if client.connected:
+            self.connected_clients.add(client.identifier)
+
+   # Name or id lookups, unknown values simply match nothing
+   def _groups(self, nameorid):
+      if nameorid in self.group_ids:
+         return {nameorid}
+      return self.group_names.get(nameorid, set())
+
+   def _streams(self, nameorid):
+      if nameorid in self.stream_ids:
+         return {nameorid}
+      return self.stream_names.get(nameorid, set())
+
+   def _clientsOf(self, group_ids):
+      result = set()
+      for gid in group_ids:
+         result |= self.group_clients.get(gid, set())
+      return result
+
+   def _groupsOf(self, stream_ids):
+      result = set()
+      for sid in stream_ids:
+         result |= self.stream_groups.get(sid, set())
+      return result
+
+   def _check(self, key, keys, kind):
+      if key not in keys:
+         raise ValueError("can't filter %s on '%s', use one of %s" %(kind, key, ', '.join(keys)))
+
+   def clients(self, where):
+      """Ids of the clients matching all (key, value) filters"""
+      result = set(self.client_ids)
+      for key, value in where:
+         self._check(key, self.CLIENT_KEYS, 'clients')
+
+         if key == 'muted':
+            match = self.muted_clients
+         elif key == 'connected':
+            match = self.connected_clients
+         elif key == 'group':
+            match = self._clientsOf(self._groups(value))
+         elif key == 'stream':
+            match = self._clientsOf(self._groupsOf(self._streams(value)))
+         elif key == 'status':
+            match = self._clientsOf(self._groupsOf(self.status_streams.get(value, set())))
+
+         if key in ('muted', 'connected') and not parseBool(value):
+            result -= match
+         else:
+            result &= match
+
+      return result
+
+   def groups(self, where):
+      """Ids of the groups matching all (key, value) filters"""
+      result = set(self.group_ids)
+      for key, value in where:
+         self._check(key, self.GROUP_KEYS, 'groups')
+
+         if key == 'muted':
+            if parseBool(value):
+               result &= self.muted_groups
+            else:
+               result -= self.muted_groups
+         elif key == 'group':
+            result &= self._groups(value)
+         elif key == 'stream':
+            result &= self._groupsOf(self._streams(value))
+         elif key == 'status':
+            result &= self._groupsOf(self.status_streams.get(value, set()))
+
+      return result
+
+   def streams(self, where):
+      """Ids of the streams matching all (key, value) filters"""
+      result = set(self.stream_ids)
+      for key, value in where:
+         self._check(key, self.STREAM_KEYS, 'streams')
+
+         if key == 'group':
+            result &= set(self.group_stream[gid] for gid in self._groups(value))
+         elif key == 'stream':
+            result &= self._streams(value)
+         elif key == 'status':
+            result &= self.status_streams.get(value, set())
+
+      return result
 
 class SnapController(object):
    """Snapcast controller"""
 
-   def __init__(self, serverstring, verbose=0, debug=False):
+   def __init__(self, session, verbose=0, debug=False, where=None, at=None, align=False):
       self._verbose = verbose
       self._debug = debug
+      self._where = where or []
+      self.failed = False
+      self._at = at
+      self._align = align or at is not None
+      self._snapindex = None
   
       # Setup logging
       self._log = logging.getLogger('SnapController')
       if self._debug:
          logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
 
-      # Parse the server string
-      try:
-         self._host, self._port = serverstring.split(':')
-
-      except ValueError:
-         self._host = serverstring
-         self._port = snapcast.control.CONTROL_PORT
-
-      else:
-         self._port   = int(self._port)
-
-      self._log.info('connecting to snapserver on %s:%s', self._host, self._port)
-
-      self._loop = asyncio.get_event_loop()
-      self._snapserver = self._loop.run_until_complete(self._update_status())
+      self._session = session
+      self._loop = session.loop
+      self._snapserver = session.connect()
 
    # Stream information
    def showStream(self, stream, meta=False, multiline=True):
       if(type(stream) is str):
          stream = self._snapserver.stream(stream)
+         if self._where and stream.identifier not in self._index().streams(self._where):
+            return
 
       if meta and stream.status != 'idle':
          meta = stream.meta
-         artist = gettag(meta, 'ARTIST', '-unknown-')
-         album = gettag(meta, 'ALBUM', '-unknown-')
-         title = gettag(meta, 'TITLE', '-unknown-')
+         artist = tag(meta, 'ARTIST', '-unknown-')
+         album = tag(meta, 'ALBUM', '-unknown-')
+         title = tag(meta, 'TITLE', '-unknown-')
 
       if multiline or self._verbose:
          print('Stream ID  : %s' %(stream.identifier))
@@ -81,19 +287,23 @@ class SnapController(object):
          if meta and stream.status != 'idle':
             print("%s playing '%s' by %s" %(stream.name, title, artist))
          else:  
-            print('[%s] %s' %(stream.state, stream.name))
+            print('[%s] %s' %(stream.status, stream.name))
 
    def showAllStreams(self, meta=False):
+      matching = self._index().streams(self._where)
       for stream in self._snapserver.streams:
-         self.showStream(stream, meta=meta, multiline=False)
+         if stream.identifier in matching:
+            self.showStream(stream, meta=meta, multiline=False)
 
    # Client information
    def showClient(self, client, multiline=True):
       if(type(client) is str):
          client = self._clientByNameOrId(client)
+         if self._where and client.identifier not in self._index().clients(self._where):
+            return
 
-      clientname = getdefault(client.name, '-noname-')
-      groupname = getdefault(client.group.name, '-noname-')
+      clientname = default(client.name, '-noname-')
+      groupname = default(client.group.name, '-noname-')
 
       if multiline or self._verbose:
          print('Client ID  : %s' %(client.identifier))
@@ -107,9 +317,15 @@ class SnapController(object):
       elif client.connected:
          print('%s (%s)' %(clientname, groupname))
 
+      # Offline clients are only listed when the filter asks for them
+      elif any(key == 'connected' and not parseBool(value) for key, value in self._where):
+         print('%s (%s) offline' %(clientname, groupname))
+
    def showAllClients(self):
+      matching = self._index().clients(self._where)
       for client in self._snapserver.clients:
-         self.showClient(client, multiline=False)
+         if client.identifier in matching:
+            self.showClient(client, multiline=False)
 
    def moveClient(self, nameorid, groupnameorid):
       pass
@@ -120,29 +336,31 @@ class SnapController(object):
       self._loop.run_until_complete(obj)
 
    def muteClients(self, nameorids, mute=True):
-      nameorids = self._expandClients(nameorids)
-      for cid in nameorids:
-         client = self._snapserver.client(cid)
-         obj = client.set_muted(mute)
-         self._loop.run_until_complete(obj)
-         if(self._verbose):
+      clients = [self._clientByNameOrId(cid) for cid in self._expandClients(nameorids)]
+      self._dispatch([(client.friendly_name,
+                       self._snapserver.client_volume(client.identifier, {'muted': mute, 'percent': client.volume}))
+                      for client in clients])
+      if(self._verbose):
+         for client in clients:
             print("Mute '%s' status %s" %(client.name, mute))
 
    # Group information
    def showGroup(self, group, multiline=True, meta=False):
       if(type(group) is str):
          group = self._groupByNameOrId(group)
+         if self._where and group.identifier not in self._index().groups(self._where):
+            return
 
-      groupname = getdefault(group.name, '-noname-')
-      streamname = getdefault(group.stream, '-none-')
+      groupname = default(group.name, '-noname-')
+      streamname = default(group.stream, '-none-')
   
       has_meta = meta
       stream = self._snapserver.stream(group.stream)
 
       if meta and stream.status != 'idle':
-         artist = gettag(stream.meta, 'ARTIST', '-unknown-')
-         album = gettag(stream.meta, 'ALBUM', '-unknown-')
-         title = gettag(stream.meta, 'TITLE', '-unknown-')
+         artist = tag(stream.meta, 'ARTIST', '-unknown-')
+         album = tag(stream.meta, 'ALBUM', '-unknown-')
+         title = tag(stream.meta, 'TITLE', '-unknown-')
          has_meta = True
 
       if multiline or self._verbose:
@@ -162,7 +380,7 @@ class SnapController(object):
          print('   clients :')
          for cid in group.clients:
             client = self._snapserver.client(cid)
-            clientname = getdefault(client.name, client.identifier)
+            clientname = default(client.name, client.identifier)
             print('      %s' %(clientname))
          print()
 
@@ -174,14 +392,15 @@ class SnapController(object):
          print('[%s] %s%s, stream %s' %(group.identifier, groupname, is_muted, streamname))
 
    def showAllGroups(self, meta=False):
+      matching = self._index().groups(self._where)
       for group in self._snapserver.groups:
-         self.showGroup(group, multiline=False, meta=meta)
+         if group.identifier in matching:
+            self.showGroup(group, multiline=False, meta=meta)
 
    # Group actions
    def assignStream(self, nameorid, stream):
       group = self._groupByNameOrId(nameorid)
-      obj = group.set_stream(stream)
-      self._loop.run_until_complete(obj)
+      self._dispatch([(group.friendly_name, self._snapserver.group_stream(group.identifier, stream))])
 
    def renameGroup(self, nameorid, newname):
       print("Rename group <%s> to <%s>" %(nameorid, newname))
@@ -200,22 +419,50 @@ class SnapController(object):
       obj = group.delete()
       self._loop.run_until_complete(obj)
 
-   def setGroupVolume(self, percent, nameorid):
-      nameorids = self._expandGroups(nameorids)
-      for gid in nameorids:
-         group = self._groupByNameOrId(gid)
-         obj = group.set_volume(volume)
-         self._loop.run_until_complete(obj)
-         if(self._verbose):
+   def setGroupVolume(self, volume, nameorids):
+      groups = [self._groupByNameOrId(gid) for gid in self._expandGroups(nameorids)]
+
+      # One request per client so they all go out in the same burst,
+      # Snapgroup.set_volume would send them one round trip apart
+      requests = []
+      for group in groups:
+         for client, percent in self._clientVolumes(group, volume):
+            obj = self._snapserver.client_volume(client.identifier, {'muted': client.muted, 'percent': percent})
+            requests.append((client.friendly_name, obj))
+
+      self._dispatch(requests)
+      if(self._verbose):
+         for group in groups:
             print("Volume for %s set to %s%%" %(group.name, volume))
 
+   def _clientVolumes(self, group, volume):
+      """Client volumes for a group volume, scaled like Snapgroup.set_volume"""
+      clients = [self._snapserver.client(cid) for cid in group.clients]
+      current = group.volume
+      if volume == current:
+         return []
+
+      if volume < current:
+         ratio = (current - volume) / current
+      else:
+         ratio = (volume - current) / (100 - current)
+
+      result = []
+      for client in clients:
+         if volume < current:
+            percent = client.volume - ratio * client.volume
+         else:
+            percent = client.volume + ratio * (100 - client.volume)
+         result.append((client, round(percent)))
+
+      return result
+
    def muteGroups(self, nameorids=None, mute=False):
-      nameorids = self._expandGroups(nameorids)
-      for gid in nameorids:
-         group = self._groupByNameOrId(gid)
-         obj = group.set_muted(mute)
-         self._loop.run_until_complete(obj)
-         if(self._verbose):
+      groups = [self._groupByNameOrId(gid) for gid in self._expandGroups(nameorids)]
+      self._dispatch([(group.friendly_name, self._snapserver.group_mute(group.identifier, mute))
+                      for group in groups])
+      if(self._verbose):
+         for group in groups:
             print("Mute %s status %s" %(group.name, mute))
 
    #
@@ -253,6 +500,11 @@ class SnapController(object):
       if(len(nameorids)==0):
          nameorids = map(lambda g: g.identifier , self._snapserver.clients)
 
+      # Keep only the clients matching the filters
+      if self._where:
+         matching = self._index().clients(self._where)
+         nameorids = [n for n in nameorids if self._clientByNameOrId(n).identifier in matching]
+
       return nameorids
 
    def _expandGroups(self, nameorids):
@@ -265,13 +517,332 @@ class SnapController(object):
       if(len(nameorids)==0):
          nameorids = map(lambda g: g.identifier , self._snapserver.groups)
 
+      # Keep only the groups matching the filters
+      if self._where:
+         matching = self._index().groups(self._where)
+         nameorids = [n for n in nameorids if self._groupByNameOrId(n).identifier in matching]
+
       return nameorids
 
+   def _index(self):
+      if self._snapindex is None:
+         self._snapindex = SnapIndex(self._snapserver)
+      return self._snapindex
+
    #
-   # Update functions
+   # Bulk actions
    #
-   def _update_status(self):
-      return (yield from snapcast.control.create_server(self._loop, self._host, self._port))
+   def _dispatch(self, requests):
+      """Run a list of (label, request) concurrently on the one connection
+
+      The requests are the server's RPC calls, which hand back an error
+      instead of raising, so failures are reported and flagged in
+      self.failed for the exit status.
+
+      When aligned the targets are already resolved and the requests
+      built, the connection is warmed up shortly before the scheduled
+      time and the requests started back to back, then the spread of
+      their start times is reported.
+      """
+      labels = [label for label, obj in requests]
+      objs = [obj for label, obj in requests]
+
+      async def run_all():
+         return await asyncio.gather(*objs)
+
+      async def start(obj, started):
+         started.append(time.time())
+         return await obj
+
+      async def warmup():
+         # One round trip so the connection and request path are warm,
+         # reconnect once if it dropped while we were waiting
+         version, error = await self._snapserver.rpc_version()
+         if error:
+            self._log.info('warm up failed (%s), reconnecting', error.get('message'))
+            await asyncio.wait_for(self._snapserver.start(), self._session.timeout)
+            version, error = await self._snapserver.rpc_version()
+            if error:
+               raise OSError(error.get('message'))
+
+      async def run_aligned():
+         # Wait until just before the schedule, a warm up done hours
+         # ahead would be cold again by then
+         if self._at is not None:
+            delay = self._at - time.time() - 1.0
+            if delay > 0:
+               await asyncio.sleep(delay)
+
+         await warmup()
+
+         if self._at is not None:
+            await self._waitUntil(self._at)
+
+         started = []
+         results = await asyncio.gather(*[start(obj, started) for obj in objs])
+         return started, results
+
+      if not objs:
+         return
+
+      if not self._align:
+         results = self._loop.run_until_complete(run_all())
+         self._reportFailures(labels, results)
+         return
+
+      try:
+         started, results = self._loop.run_until_complete(run_aligned())
+
+      except (OSError, asyncio.TimeoutError) as e:
+         for obj in objs:
+            obj.close()
+         print("Can't reach snapserver, nothing sent: %s" %(e or 'timeout'))
+         self.failed = True
+         return
+
+      self._reportDispatch(started)
+      self._reportFailures(labels, results)
+
+   def _reportFailures(self, labels, results):
+      # A JSON-RPC error is a dict with code and message
+      for label, result in zip(labels, results):
+         if isinstance(result, dict) and 'code' in result and 'message' in result:
+            print("Failed '%s': %s" %(label, result['message']))
+            self.failed = True
+
+   async def _waitUntil(self, when):
+      # The loop timer is only good to a millisecond or so, sleep most
+      # of the way and spin for the rest
+      delay = when - time.time() - 0.005
+      if delay > 0:
+         await asyncio.sleep(delay)
+
+      while time.time() < when:
+         pass
+
+   def _reportDispatch(self, started):
+      first = min(started)
+      report = 'Started %d request(s) at %s, start spread %.3f ms' %(
+         len(started),
+         datetime.datetime.fromtimestamp(first).strftime('%H:%M:%S.%f'),
+         (max(started) - first) * 1000)
+
+      if self._at is not None:
+         report += ', %.3f ms after schedule' %((first - self._at) * 1000)
+
+      print(report)
+
+   #
+   # Name cache for shell completion
+   #
+   # One plain text file per kind, one name or id per line, so the
+   # completion script can read it directly without starting python.
+   #
+   def saveNameCache(self):
+      names = {
+         'clients': [],
+         'groups': [],
+         'streams': [],
+      }
+
+      for c in self._snapserver.clients:
+         names['clients'].append(c.identifier)
+         if c.name:
+            names['clients'].append(c.name)
+
+      for g in self._snapserver.groups:
+         names['groups'].append(g.identifier)
+         if g.name:
+            names['groups'].append(g.name)
+
+      for s in self._snapserver.streams:
+         names['streams'].append(s.identifier)
+
+      cachedir = namecachedir()
+      os.makedirs(cachedir, exist_ok=True)
+
+      for kind, entries in names.items():
+         path = os.path.join(cachedir, kind)
+         tmppath = '%s.%d' %(path, os.getpid())
+         with open(tmppath, 'w') as f:
+            for entry in sorted(set(entries)):
+               f.write('%s\n' %(entry))
+
+         # Atomic replace, a completion running now sees old or new file
+         os.replace(tmppath, path)
+
+#
+# Round trip latency probe
+#
+def percentile(values, pct):
+   """Nearest rank percentile of a sorted list"""
+   rank = max(1, int(math.ceil(pct / 100.0 * len(values))))
+   return values[rank - 1]
+
+def ping(serverstring, count=10, interval=0.2, as_json=False):
+   """Time connect, full status and repeated lightweight requests
+
+   Every request is bounded by the session timeout, a timeout counts as
+   an error. Returns False when the server could not be reached or no
+   request got an answer.
+   """
+   result = {}
+
+   async def request(obj):
+      try:
+         return await asyncio.wait_for(obj, session.timeout)
+      except asyncio.TimeoutError:
+         return None, {'message': 'timeout'}
+
+   async def probe(snapserver):
+
+      start = time.perf_counter()
+      status, error = await request(snapserver.status())
+      if error:
+         result['status_error'] = error.get('message', str(error))
+      else:
+         result['status_ms'] = (time.perf_counter() - start) * 1000
+         # Estimate, the result re-encoded the way snapserver sends it
+         # without the JSON-RPC envelope
+         result['status_bytes'] = len(json.dumps(status, separators=(',', ':'), ensure_ascii=False).encode())
+
+      rtts = []
+      errors = 0
+      for i in range(count):
+         if i:
+            await asyncio.sleep(interval)
+
+         start = time.perf_counter()
+         version, error = await request(snapserver.rpc_version())
+         if error:
+            errors += 1
+         else:
+            rtts.append((time.perf_counter() - start) * 1000)
+
+      result['sent'] = count
+      result['errors'] = errors
+      if rtts:
+         rtts.sort()
+         result['rtt_ms'] = {
+            'min': rtts[0],
+            'p50': percentile(rtts, 50),
+            'p95': percentile(rtts, 95),
+            'p99': percentile(rtts, 99),
+            'max': rtts[-1],
+         }
+
+   with Session(serverstring) as session:
+      result['server'] = '%s:%d' %(session.host, session.port)
+
+      # Connect includes the library's initial status download
+      try:
+         start = time.perf_counter()
+         snapserver = session.connect()
+         result['connect_ms'] = (time.perf_counter() - start) * 1000
+
+      except OSError:
+         if as_json:
+            print(json.dumps({'server': result['server'], 'error': "can't connect"}))
+         else:
+            print("Can't connect to %s" %(result['server']))
+         return False
+
+      session.run(probe(snapserver))
+
+   if as_json:
+      print(json.dumps(result, indent=3))
+      return 'rtt_ms' in result
+
+   print('Snapserver %s' %(result['server']))
+   print('   connect : %.3f ms' %(result['connect_ms']))
+   if 'status_error' in result:
+      print('   status  : %s' %(result['status_error']))
+   else:
+      print('   status  : %.3f ms, ~%d bytes' %(result['status_ms'], result['status_bytes']))
+   print('   sent    : %d, %d errors' %(result['sent'], result['errors']))
+   if 'rtt_ms' in result:
+      rtt = result['rtt_ms']
+      print('   rtt     : min %.3f, p50 %.3f, p95 %.3f, p99 %.3f, max %.3f ms' %(
+         rtt['min'], rtt['p50'], rtt['p95'], rtt['p99'], rtt['max']))
+
+   return 'rtt_ms' in result
+
+#
+# Run the parsed command
+#
+def runCommand(controller, args, parser):
+
+   # Show one or all streams
+   if('showstream' in args and args.showstream):
+      if args.nameorid:
+         for nameorid in args.nameorid:
+            controller.showStream(nameorid, meta=args.meta)
+      else:
+         controller.showAllStreams(meta=args.meta)
+
+   # Show one or more clients
+   elif('showclient' in args and args.showclient):
+      if args.nameorid:
+         for nameorid in args.nameorid:
+            controller.showClient(nameorid)
+      else:
+         controller.showAllClients()
+
+   # Rename a client
+   elif('renclient' in args and args.renclient):
+      controller.renameClient(args.nameorid, args.newname)
+
+   # Assign a client to a target group
+   elif('moveclient' in args and args.moveclient):
+      controller.moveClient(args.nameorid, args.groupnameorid)
+
+   # Mute a client
+   elif('muteclient' in args and args.muteclient):
+      controller.muteClients(args.nameorid, mute=True)
+
+   # Unmute a client
+   elif('unmuteclient' in args and args.unmuteclient):
+      controller.muteClients(args.nameorid, mute=False)
+
+   # Show one or more groups
+   elif('showgroup' in args and args.showgroup):
+      if args.nameorid:
+         for nameorid in args.nameorid:
+            controller.showGroup(nameorid, meta=args.meta)
+      else:
+         controller.showAllGroups(meta=args.meta)
+
+   # Add a group
+   elif('addgroup' in args and args.addgroup):
+      controller.addGroup(args.newname)
+
+   # Delete a group
+   elif('delgroup' in args and args.delgroup):
+      controller.deleteGroup(args.nameorid)
+
+   # Rename a group
+   elif('rengroup' in args and args.rengroup):
+      controller.renameGroup(args.nameorid, args.newname)
+
+   # Assign a stream to a group
+   elif('assigngroup' in args and args.assigngroup):
+      controller.assignStream(args.nameorid, args.stream)
+
+   # Mute a group
+   elif('mutegroup' in args and args.mutegroup):
+      controller.muteGroups(args.nameorid, mute=True)
+
+   # Unmute a group
+   elif('unmutegroup' in args and args.unmutegroup):
+      controller.muteGroups(args.nameorid, mute=False)
+
+   # Set group volume
+   elif('volumegroup' in args and args.volumegroup):
+      controller.setGroupVolume(args.percent, args.nameorid)
+
+   # No arguments given, display help
+   else:
+      parser.print_help()
 
 #
 # Snapctl main, parser and options
@@ -285,7 +856,13 @@ def main():
    parser.add_argument('-v', '--verbose', action='count', default=0)
    parser.add_argument('-d', '--debug', action='store_true')
    parser.add_argument('-m', '--meta', action='store_true', default=False, help='Display metadata where applicable')
-   parser.add_argument('-s', '--server', default=os.environ.get('SNAPSERVER', '127.0.0.1:1705'))
+   parser.add_argument('-s', '--server', default=os.environ.get('SNAPSERVER', DEFAULT_SERVER))
+   parser.add_argument('-w', '--where', action='append', type=parseWhere, default=[], metavar='KEY=VALUE',
+      help='Only list or act on objects matching, clients: muted, connected, group, stream, status; groups: muted, group, stream, status; streams: group, stream, status')
+   parser.add_argument('--at', type=parseTime, metavar='TIME',
+      help='Send the requests at HH:MM[:SS[.ffffff]] local time or +SECONDS from now, implies --align')
+   parser.add_argument('--align', action='store_true', default=False,
+      help='Prepare all requests and send them in one burst, report the dispatch spread')
    subparsers = parser.add_subparsers(help='Snapcast control commands')
    
    #
@@ -296,29 +873,29 @@ def main():
 
    # snapctl group stream <nameorid> <id>
    parser_group_stream = group_sub.add_parser('stream', help='Mute a group volume')
-   parser_group_stream.set_defaults(assigngroup=True)
+   parser_group_stream.set_defaults(assigngroup=True, schedulable=True)
    parser_group_stream.add_argument('nameorid', help='Name or id of group')
    parser_group_stream.add_argument('stream', help='Stream to assign')
 
    # snapctl group mute
    parser_group_mute = group_sub.add_parser('mute', help='Mute a group volume')
-   parser_group_mute.set_defaults(mutegroup=True)
+   parser_group_mute.set_defaults(mutegroup=True, wherekind='groups', schedulable=True)
    parser_group_mute.add_argument('nameorid', nargs='*', help='Name or id of group(s)')
 
    # snapctl group unmute
    parser_group_unmute = group_sub.add_parser('unmute', help='Unmute a group volume')
-   parser_group_unmute.set_defaults(unmutegroup=True)
+   parser_group_unmute.set_defaults(unmutegroup=True, wherekind='groups', schedulable=True)
    parser_group_unmute.add_argument('nameorid', nargs='*', help='Name or id of group(s)')
 
    # snapctl group volume <percent>
    parser_group_volume = group_sub.add_parser('volume', help='Set a group volume')
-   parser_group_volume.set_defaults(volumegroup=True)
-   parser_group_volume.add_argument('percent', action='store', help='Group volume')
+   parser_group_volume.set_defaults(volumegroup=True, wherekind='groups', schedulable=True)
+   parser_group_volume.add_argument('percent', type=parsePercent, help='Group volume, 0-100')
    parser_group_volume.add_argument('nameorid', nargs='*', help='Name or id of group(s)')
 
    # snapctl group show <nameorid>
    parser_group_show = group_sub.add_parser('show', help='Display information about one,more or all groups')
-   parser_group_show.set_defaults(showgroup=True)
+   parser_group_show.set_defaults(showgroup=True, wherekind='groups')
    parser_group_show.add_argument('nameorid', nargs='*', help='Name or id of group(s)')
 
    # snapctl group add <name> 
@@ -345,7 +922,7 @@ def main():
 
    # snapctl stream show <nameorid>
    parser_stream_show = stream_sub.add_parser('show', help='Show one or all streams')
-   parser_stream_show.set_defaults(showstream=True)
+   parser_stream_show.set_defaults(showstream=True, wherekind='streams')
    parser_stream_show.add_argument('nameorid',nargs='*')
 
    #
@@ -356,7 +933,7 @@ def main():
 
    # snapctl client show <nameorid>
    parser_client_show = client_sub.add_parser('show', help='Show a client')
-   parser_client_show.set_defaults(showclient=True)
+   parser_client_show.set_defaults(showclient=True, wherekind='clients')
    parser_client_show.add_argument('nameorid',nargs='*')
 
    # snapctl client rename <nameorid> <name>
@@ -373,96 +950,68 @@ def main():
 
    # snapctl client mute
    parser_client_mute = client_sub.add_parser('mute', help='Mute a client volume')
-   parser_client_mute.set_defaults(muteclient=True)
+   parser_client_mute.set_defaults(muteclient=True, wherekind='clients', schedulable=True)
    parser_client_mute.add_argument('nameorid', nargs='*', help='Name or id of client(s)')
 
    # snapctl client unmute
    parser_client_unmute = client_sub.add_parser('unmute', help='Unmute a client volume')
-   parser_client_unmute.set_defaults(unmuteclient=True)
+   parser_client_unmute.set_defaults(unmuteclient=True, wherekind='clients', schedulable=True)
    parser_client_unmute.add_argument('nameorid', nargs='*', help='Name or id of client(s)')
 
+   #
+   # The ping command
+   #
+   # snapctl ping [-n COUNT] [-i INTERVAL] [-j]
+   parser_ping = subparsers.add_parser('ping', help='Measure round trip time to the server')
+   parser_ping.set_defaults(ping=True)
+   parser_ping.add_argument('-n', '--count', type=parseCount, default=10, help='Number of requests to send')
+   parser_ping.add_argument('-i', '--interval', type=float, default=0.2, help='Seconds between requests')
+   parser_ping.add_argument('-j', '--json', action='store_true', default=False, help='Output JSON')
+
    # Do the parse
    args = parser.parse_args()
 
-   # Setup controller
-   try:
-      controller = SnapController(args.server, verbose=args.verbose, debug=args.debug)
+   # Filters must make sense for the kind of objects the command handles
+   if args.where:
+      wherekind = getattr(args, 'wherekind', None)
+      if not wherekind:
+         parser.error('--where is not supported by this command')
 
-   except OSError:
-      print("Can't connect to %s" %(args.server))
-      return
+      for key, value in args.where:
+         if key not in SnapIndex.KEYS[wherekind]:
+            parser.error("can't filter %s on '%s', use one of %s" %(wherekind, key, ', '.join(SnapIndex.KEYS[wherekind])))
 
-   # Show one or all streams
-   if('showstream' in args and args.showstream):
-      if args.nameorid:
-         for nameorid in args.nameorid:
-            controller.showStream(nameorid, meta=args.meta)
-      else:
-         controller.showAllStreams(meta=args.meta)
-
-   # Show one or more clients
-   elif('showclient' in args and args.showclient):
-      if args.nameorid:
-         for nameorid in args.nameorid:
-            controller.showClient(nameorid)
-      else:
-         controller.showAllClients()
+   # Only requests changing the server can be aligned
+   if (args.at is not None or args.align) and not getattr(args, 'schedulable', False):
+      parser.error('--at and --align are not supported by this command')
 
-   # Rename a client
-   elif('renclient' in args and args.renclient):
-      controller.renameClient(args.nameorid, args.newname)
-
-   # Assign a client to a target group
-   elif('moveclient' in args and args.moveclient):
-      controller.moveClient(args.nameorid, args.groupnameorid)
-
-   # Mute a client
-   elif('muteclient' in args and args.muteclient):
-      controller.muteClients(args.nameorid, mute=True)
-
-   # Unmute a client
-   elif('unmuteclient' in args and args.unmuteclient):
-      controller.muteClients(args.nameorid, mute=False)
-
-   # Show one or more groups
-   elif('showgroup' in args and args.showgroup):
-      if args.nameorid:
-         for nameorid in args.nameorid:
-            controller.showGroup(nameorid, meta=args.meta)
-      else:
-         controller.showAllGroups(meta=args.meta)
-
-   # Add a group
-   elif('addgroup' in args and args.addgroup):
-      controller.addGroup(args.newname)
+   # Ping opens and times its own connection
+   if('ping' in args and args.ping):
+      if not ping(args.server, count=args.count, interval=args.interval, as_json=args.json):
+         sys.exit(1)
+      return
 
-   # Delete a group
-   elif('delgroup' in args and args.delgroup):
-      controller.deleteGroup(args.nameorid)
+   # Setup controller, the session is closed however the command ends
+   with Session(args.server) as session:
+      try:
+         controller = SnapController(session, verbose=args.verbose, debug=args.debug, where=args.where, at=args.at, align=args.align)
 
-   # Rename a group
-   elif('rengroup' in args and args.rengroup):
-      controller.renameGroup(args.nameorid, args.newname)
+      except OSError:
+         print("Can't connect to %s" %(args.server))
+         return
 
-   # Assign a stream to a group
-   elif('assigngroup' in args and args.assigngroup):
-      controller.assignStream(args.nameorid, args.stream)
+      runCommand(controller, args, parser)
 
-   # Mute a group
-   elif('mutegroup' in args and args.mutegroup):
-      controller.muteGroups(args.nameorid, mute=True)
-
-   # Unmute a group
-   elif('unmutegroup' in args and args.unmutegroup):
-      controller.muteGroups(args.nameorid, mute=False)
+      # Refresh the completion name cache now the command is done, a
+      # stale or unwritable cache must never fail the command itself
+      try:
+         controller.saveNameCache()
 
-   # Set group volume
-   elif('volumegroup' in args and args.volumegroup):
-      controller.setGroupVolume(args.percent, args.nameorid)
+      except OSError as e:
+         logging.getLogger('SnapController').debug('name cache not saved: %s', e)
 
-   # No arguments given, display help
-   else:
-      parser.print_help()
+   if controller.failed:
+      sys.exit(1)
 
 if __name__ == '__main__':
    main()
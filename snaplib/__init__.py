@@ -0,0 +1,10 @@
+"""
+Shared helpers for the snapcast tools
+
+Connection handling and metadata helpers used by snapctl, snapstatus,
+snapmeta, snapmon and playing.
+
+Author: github.com/frafall
+"""
+from snaplib.session import Session, serverPort, DEFAULT_SERVER, DEFAULT_TIMEOUT
+from snaplib.meta import tag, default
@@ -0,0 +1,17 @@
+"""
+Metadata helpers
+
+Author: github.com/frafall
+"""
+
+def default(a, b):
+   """a unless empty, else b"""
+   if a:
+      return a
+   return b
+
+def tag(jtag, name, default=None):
+   """Tag value from a stream meta dict, which may be missing"""
+   if jtag and name in jtag:
+      return jtag[name]
+   return default
@@ -0,0 +1,85 @@
+"""
+Snapserver session
+
+One event loop and one connection per process, set up the same way for
+every tool: server from the command line or $SNAPSERVER, connect with a
+timeout, and the connection reused for everything the tool does.
+
+Author: github.com/frafall
+"""
+import os
+import logging
+import asyncio
+
+import snapcast.control
+
+DEFAULT_SERVER = '127.0.0.1'
+DEFAULT_TIMEOUT = 5.0
+
+def serverPort(serverstring):
+   """Split 'host[:port]' into host and port"""
+   try:
+      host, port = serverstring.split(':')
+
+   except ValueError:
+      host = serverstring
+      port = snapcast.control.CONTROL_PORT
+
+   else:
+      port = int(port)
+
+   return host, port
+
+class Session(object):
+   """Connection to a snapserver
+
+   The connection is made on the first connect() and kept until close(),
+   later connect() calls return the same server object. Connect failures
+   and timeouts raise OSError.
+   """
+
+   def __init__(self, serverstring=None, timeout=DEFAULT_TIMEOUT, reconnect=False):
+      if not serverstring:
+         serverstring = os.environ.get('SNAPSERVER', DEFAULT_SERVER)
+
+      self.host, self.port = serverPort(serverstring)
+      self.timeout = timeout
+      self.reconnect = reconnect
+      self.server = None
+
+      self._log = logging.getLogger('Session')
+      self.loop = asyncio.new_event_loop()
+      asyncio.set_event_loop(self.loop)
+
+   def connect(self):
+      if self.server is None:
+         self._log.info('connecting to snapserver on %s:%s', self.host, self.port)
+         obj = snapcast.control.create_server(self.loop, self.host, self.port, reconnect=self.reconnect)
+
+         try:
+            self.server = self.run(asyncio.wait_for(obj, self.timeout))
+
+         except asyncio.TimeoutError:
+            raise OSError('timeout connecting to %s:%d' %(self.host, self.port))
+
+      return self.server
+
+   def run(self, obj):
+      """Run a coroutine on the session loop"""
+      return self.loop.run_until_complete(obj)
+
+   def close(self):
+      if self.server is not None:
+         self.server.stop()
+         self.server = None
+
+         # Let the transport finish closing before the loop goes
+         self.run(asyncio.sleep(0))
+
+      self.loop.close()
+
+   def __enter__(self):
+      return self
+
+   def __exit__(self, *exc):
+      self.close()
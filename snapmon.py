@@ -11,89 +11,146 @@ import signal
 import functools
 import logging
 import argparse
-import snapcast.control
 import asyncio
 import json
 
-from concurrent.futures import CancelledError
+from snaplib import Session, tag, default
 
 #logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
 #logger = logging.getLogger(__name__)
 
-def serverPort(service):
-   try:
-      server, port = service.split(':')
+#
+# Metadata trimming and render cache
+#
+# The monitor runs for days with the library's server object alive to
+# deliver updates. Stream metadata can carry cover art and long comments,
+# so it is cut down to the tags we render as soon as it arrives; that is
+# what bounds memory. The render cache only holds what OnGroupUpdate
+# prints, it saves nothing by itself.
+#
+RENDERED_TAGS = ('ARTIST', 'ALBUM', 'TITLE')
+
+def trimMeta(stream):
+   """Drop all but RENDERED_TAGS from the library's stream metadata"""
+   meta = stream.meta or {}
+   if any(name not in RENDERED_TAGS for name in meta):
+      stream.update_meta({name: meta[name] for name in RENDERED_TAGS if name in meta})
+   return meta
+
+class StreamRecord(object):
+   __slots__ = ('artist', 'title')
+
+   def __init__(self):
+      self.artist = None
+      self.title = None
 
-   except ValueError:
-      server = service
-      port   = snapcast.control.CONTROL_PORT
+class GroupRecord(object):
+   __slots__ = ('name', 'stream')
 
-   else:
-      port   = int(port)
+   def __init__(self):
+      self.name = None
+      self.stream = None
 
-   return server, port
+class RenderCache(object):
+   """Zone names and track tags as printed by the monitor"""
 
-def default(a,b):
-   if a:
-      return a
-   return b
-      
-def tag(jtag, name, default=None):
-   if(name in jtag):
-      return jtag[name]
-   return default
+   def __init__(self):
+      self.groups = {}
+      self.streams = {}
 
-def run_cmd(loop, server, port):
-   return (yield from snapcast.control.create_server(loop, server, port))
+   def update(self, snapserver):
+      """Full resync, also forgets groups and streams that are gone"""
+      self.streams = {}
+      self.groups = {}
+
+      for stream in snapserver.streams:
+         self.updateStream(stream)
+      for group in snapserver.groups:
+         self.updateGroup(group)
+
+   def updateStream(self, stream):
+      record = self.streams.get(stream.identifier)
+      if record is None:
+         record = self.streams[stream.identifier] = StreamRecord()
+
+      meta = trimMeta(stream)
+      record.artist = tag(meta, 'ARTIST')
+      record.title = tag(meta, 'TITLE')
+      return record
+
+   def updateGroup(self, group):
+      record = self.groups.get(group.identifier)
+      if record is None:
+         record = self.groups[group.identifier] = GroupRecord()
+
+      record.name = group.friendly_name
+      record.stream = group.stream
+      return record
 
 def main():
    verbose = 0
 
    def shutdown(signame):
-      for task in asyncio.Task.all_tasks():
+      for task in asyncio.all_tasks(loop):
          task.cancel()
 
    def OnGroupUpdate(group):
-      stream = snapserver.stream(group.stream)
-      title = tag(stream.meta,'TITLE', '<unknown>')
-      artist = tag(stream.meta,'ARTIST', '<unknown>')
-      print("Zone '%s' playing '%s' by '%s'" %(group.friendly_name, title, artist))
+      zone = cache.updateGroup(group)
+      stream = cache.updateStream(snapserver.stream(zone.stream))
+      title = default(stream.title, '<unknown>')
+      artist = default(stream.artist, '<unknown>')
+      print("Zone '%s' playing '%s' by '%s'" %(zone.name, title, artist))
+
+   # Follow every group and stream, again after a server resync since
+   # that can bring new objects and fresh full metadata
+   def OnServerUpdate():
+      cache.update(snapserver)
+      for stream in snapserver.streams:
+         stream.set_callback(cache.updateStream)
+      for group in snapserver.groups:
+         group.set_callback(OnGroupUpdate)
 
    async def run_status(loop, snapserver):
       while True:
          await asyncio.sleep(1)
 
+         # Stream.OnMetadata and Stream.OnProperties only reach the group
+         # callbacks, so streams no group plays are trimmed here
+         for stream in snapserver.streams:
+            trimMeta(stream)
+
    # Parse arguments
    parser = argparse.ArgumentParser()
    parser.add_argument('-v', '--verbose', action='count', default=0)
-   parser.add_argument('-s', '--server', default=os.environ.get('SNAPSERVER', '127.0.0.1'))
+   parser.add_argument('-s', '--server', default=os.environ.get('SNAPSERVER'))
 
    args = parser.parse_args()
-   server, port = serverPort(args.server)
 
-   print("Connecting to %s port %d" %(server, port))
-   loop = asyncio.get_event_loop()
+   # Keep the connection across server restarts
+   with Session(args.server, reconnect=True) as session:
+      loop = session.loop
 
-   for signame in ('SIGINT', 'SIGTERM'):
-      loop.add_signal_handler(getattr(signal, signame), functools.partial(shutdown, signame))
+      print("Connecting to %s port %d" %(session.host, session.port))
 
-   try:
-      snapserver = loop.run_until_complete(run_cmd(loop, server, port))
+      for signame in ('SIGINT', 'SIGTERM'):
+         loop.add_signal_handler(getattr(signal, signame), functools.partial(shutdown, signame))
 
-   except OSError:
-      print("Can't connect to %s:%d" %(server, port))
-      return
+      try:
+         snapserver = session.connect()
 
-   for group in snapserver.groups:
-      group.set_callback(OnGroupUpdate)
+      except OSError:
+         print("Can't connect to %s:%d" %(session.host, session.port))
+         return
 
-   try:
-      loop.run_until_complete(run_status(loop, snapserver))
+      cache = RenderCache()
+      OnServerUpdate()
+      snapserver.set_on_update_callback(OnServerUpdate)
 
-   except CancelledError:
-      pass
+      try:
+         loop.run_until_complete(run_status(loop, snapserver))
 
-   loop.close()
+      except asyncio.CancelledError:
+         pass
 
 if __name__ == '__main__':
    main()